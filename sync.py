@@ -4,13 +4,19 @@ TradingView to Notion Sync
 Parse TradingView paper trading CSV exports and sync completed trades to Notion.
 """
 
+import asyncio
 import csv
 import os
-import json
+import re
+import sqlite3
+import sys
 from datetime import datetime
-from typing import List, Dict, Optional
+from functools import lru_cache, partial
+from operator import itemgetter
+from typing import Callable, Iterable, Iterator, List, Optional, Set, Tuple
 from collections import defaultdict
-import requests
+import httpx
+import orjson
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -21,6 +27,7 @@ class Config:
     NOTION_API_KEY = os.getenv('NOTION_API_KEY', '')
     NOTION_DATABASE_ID = os.getenv('NOTION_DATABASE_ID', '')
     CSV_FILE_PATH = os.getenv('CSV_FILE_PATH', 'trades.csv')
+    SYNC_STATE_DB = os.getenv('SYNC_STATE_DB', '.sync_state.db')
     
     @classmethod
     def validate(cls):
@@ -29,154 +36,169 @@ class Config:
         if not cls.NOTION_DATABASE_ID:
             raise ValueError("NOTION_DATABASE_ID environment variable not set")
 
+# Bytes read from disk per chunk while streaming the CSV
+CSV_READ_BUFFER_SIZE = 1 << 20
+
+# TradingView export columns, in the order TradeOrder unpacks them
+CSV_COLUMNS = (
+    'Symbol', 'Side', 'Type', 'Qty', 'Limit Price', 'Stop Price',
+    'Fill Price', 'Status', 'Placing Time', 'Closing Time', 'Order ID',
+)
+
+_BUY = sys.intern('Buy')
+_SELL = sys.intern('Sell')
+
 class TradeOrder:
     """Represents a single order from TradingView CSV"""
-    def __init__(self, row: Dict):
-        self.symbol = row.get('Symbol', '').strip()
-        self.side = row.get('Side', '').strip()  # Buy or Sell
-        self.order_type = row.get('Type', '').strip()
-        self.qty = float(row.get('Qty', 0) or 0)
-        self.limit_price = float(row.get('Limit Price', 0) or 0)
-        self.stop_price = float(row.get('Stop Price', 0) or 0)
-        self.fill_price = float(row.get('Fill Price', 0) or 0)
-        self.status = row.get('Status', '').strip()
-        self.placing_time = row.get('Placing Time', '').strip()
-        self.closing_time = row.get('Closing Time', '').strip()
-        self.order_id = row.get('Order ID', '').strip()
-        
-    def is_filled(self) -> bool:
-        return self.status == 'Filled'
+    __slots__ = (
+        'symbol', 'side', 'order_type', 'qty', 'limit_price', 'stop_price',
+        'fill_price', 'status', 'placing_time', 'closing_time', 'order_id',
+        'is_buy', 'is_sell',
+    )
     
-    def is_buy(self) -> bool:
-        return self.side == 'Buy'
-    
-    def is_sell(self) -> bool:
-        return self.side == 'Sell'
+    def __init__(self, fields: Tuple[str, ...]):
+        (symbol, side, order_type, qty, limit_price, stop_price,
+         fill_price, status, placing_time, closing_time, order_id) = fields
+        # These columns take only a handful of distinct values, so intern them
+        # to share one string per value and allow identity comparisons
+        self.symbol = sys.intern(symbol.strip())
+        self.side = sys.intern(side.strip())  # Buy or Sell
+        self.order_type = sys.intern(order_type.strip())
+        # Blank numeric cells (e.g. no stop price) short-circuit to 0.0
+        self.qty = float(qty) if qty else 0.0
+        self.limit_price = float(limit_price) if limit_price else 0.0
+        self.stop_price = float(stop_price) if stop_price else 0.0
+        self.fill_price = float(fill_price) if fill_price else 0.0
+        self.status = sys.intern(status.strip())
+        self.placing_time = placing_time.strip()
+        self.closing_time = closing_time.strip()
+        self.order_id = order_id.strip()
+        self.is_buy = self.side is _BUY
+        self.is_sell = self.side is _SELL
 
 class Trade:
     """Represents a completed trade (Buy + Sell pair)"""
-    def __init__(self, symbol: str, buy_order: TradeOrder, sell_order: TradeOrder):
+    __slots__ = (
+        'symbol', 'buy_order', 'sell_order', 'entry_price', 'exit_price',
+        'position_size', 'pnl_dollars', 'pnl_percent', 'result',
+        'entry_date', 'exit_date',
+    )
+    
+    def __init__(self, symbol: str, buy_order: TradeOrder, sell_order: TradeOrder,
+                 position_size: float):
         self.symbol = symbol
         self.buy_order = buy_order
         self.sell_order = sell_order
+        self.position_size = position_size  # Quantity matched between the two orders
+        self.entry_price = entry_price = buy_order.fill_price
+        self.exit_price = exit_price = sell_order.fill_price
+        self.entry_date = buy_order.closing_time
+        self.exit_date = sell_order.closing_time
         
-    @property
-    def entry_price(self) -> float:
-        return self.buy_order.fill_price
-    
-    @property
-    def exit_price(self) -> float:
-        return self.sell_order.fill_price
-    
-    @property
-    def position_size(self) -> float:
-        return min(self.buy_order.qty, self.sell_order.qty)
-    
-    @property
-    def pnl_dollars(self) -> float:
-        return (self.exit_price - self.entry_price) * self.position_size
-    
-    @property
-    def pnl_percent(self) -> float:
-        if self.entry_price == 0:
-            return 0
-        return ((self.exit_price - self.entry_price) / self.entry_price) * 100
-    
-    @property
-    def result(self) -> str:
-        if self.pnl_dollars > 0:
-            return 'Win'
-        elif self.pnl_dollars < 0:
-            return 'Loss'
-        return 'Breakeven'
-    
-    @property
-    def entry_date(self) -> str:
-        return self.buy_order.closing_time
-    
-    @property
-    def exit_date(self) -> str:
-        return self.sell_order.closing_time
+        # Work from locals and a single price move rather than re-reading
+        # attributes for each derived figure
+        price_change = exit_price - entry_price
+        self.pnl_dollars = pnl_dollars = price_change * position_size
+        self.pnl_percent = (price_change / entry_price) * 100 if entry_price else 0
+        
+        if pnl_dollars > 0:
+            self.result = 'Win'
+        elif pnl_dollars < 0:
+            self.result = 'Loss'
+        else:
+            self.result = 'Breakeven'
 
-def parse_csv(file_path: str) -> List[TradeOrder]:
-    """Parse TradingView CSV file"""
-    orders = []
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                order = TradeOrder(row)
-                if order.is_filled():
-                    orders.append(order)
-        print(f"Parsed {len(orders)} filled orders from CSV")
-        return orders
-    except FileNotFoundError:
-        print(f"Error: CSV file not found: {file_path}")
-        return []
-    except Exception as e:
-        print(f"Error parsing CSV: {str(e)}")
-        return []
+def iter_orders(file_path: str) -> Iterator[TradeOrder]:
+    """Stream filled orders from a TradingView CSV file, raising on parse errors"""
+    with open(file_path, 'r', encoding='utf-8', newline='',
+              buffering=CSV_READ_BUFFER_SIZE) as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        # Resolve column positions once instead of building a dict per row
+        positions = {name: i for i, name in enumerate(header)}
+        missing = [name for name in CSV_COLUMNS if name not in positions]
+        if missing:
+            raise ValueError(f"Missing CSV columns: {', '.join(missing)}")
+        # itemgetter pulls all the fields out of each row in a single C call
+        get_fields = itemgetter(*(positions[name] for name in CSV_COLUMNS))
+        # Check status on the raw row so pending/cancelled orders are
+        # never parsed
+        i_status = positions['Status']
+        for row in reader:
+            # csv.reader yields [] for blank lines, which DictReader skipped
+            if row and row[i_status].strip() == 'Filled':
+                yield TradeOrder(get_fields(row))
 
-def match_trades(orders: List[TradeOrder]) -> List[Trade]:
+def match_trades(orders: Iterable[TradeOrder]) -> List[Trade]:
     """Match Buy and Sell orders to create complete trades"""
-    # Group orders by symbol
-    by_symbol = defaultdict(lambda: {'buys': [], 'sells': []})
+    # Sort once by closing time so every per-symbol bucket is already ordered
+    orders = sorted(orders, key=lambda x: x.closing_time)
     
+    # Group orders by symbol and side
+    buys_by_symbol = defaultdict(list)
+    sells_by_symbol = defaultdict(list)
     for order in orders:
-        if order.is_buy():
-            by_symbol[order.symbol]['buys'].append(order)
-        elif order.is_sell():
-            by_symbol[order.symbol]['sells'].append(order)
+        if order.is_buy:
+            buys_by_symbol[order.symbol].append(order)
+        elif order.is_sell:
+            sells_by_symbol[order.symbol].append(order)
     
     # Match buys with sells
     trades = []
-    for symbol, orders_dict in by_symbol.items():
-        buys = sorted(orders_dict['buys'], key=lambda x: x.closing_time)
-        sells = sorted(orders_dict['sells'], key=lambda x: x.closing_time)
+    for symbol, buys in buys_by_symbol.items():
+        sells = sells_by_symbol.get(symbol)
+        if not sells:
+            continue
         
-        # Simple FIFO matching
-        for buy in buys:
-            for sell in sells:
-                # Match if sell happened after buy and quantities are compatible
-                if sell.closing_time > buy.closing_time and sell.qty > 0 and buy.qty > 0:
-                    trade = Trade(symbol, buy, sell)
-                    trades.append(trade)
-                    
-                    # Reduce quantities for partial fills
-                    matched_qty = min(buy.qty, sell.qty)
-                    buy.qty -= matched_qty
-                    sell.qty -= matched_qty
-                    
-                    if buy.qty == 0:
-                        break
+        # FIFO matching with a running pointer into each side. Buys before i
+        # are used up and sells before j are closed out, so nothing is rescanned.
+        i = j = 0
+        while i < len(buys) and j < len(sells):
+            buy = buys[i]
+            sell = sells[j]
+            if buy.qty <= 0:
+                i += 1
+            elif sell.qty <= 0 or sell.closing_time <= buy.closing_time:
+                # Exhausted, or closed before the oldest open buy was filled
+                j += 1
+            else:
+                matched_qty = min(buy.qty, sell.qty)
+                trades.append(Trade(symbol, buy, sell, matched_qty))
+                
+                # Reduce quantities for partial fills
+                buy.qty -= matched_qty
+                sell.qty -= matched_qty
     
     print(f"Matched {len(trades)} complete trades")
     return trades
 
-def create_notion_page(trade: Trade) -> Dict:
-    """Create Notion database entry for a trade"""
-    return {
-        "parent": {"database_id": Config.NOTION_DATABASE_ID},
+@lru_cache(maxsize=None)
+def _page_template(database_id: str) -> bytes:
+    """Serialized Notion page with %-placeholders for the per-trade values"""
+    page = {
+        "parent": {"database_id": database_id},
         "properties": {
             "Name": {
                 "title": [
                     {
                         "text": {
-                            "content": f"{trade.symbol} - {trade.entry_date[:10]}"
+                            "content": "@name@"
                         }
                     }
                 ]
             },
             "Date": {
                 "date": {
-                    "start": parse_notion_date(trade.entry_date)
+                    "start": "@date@"
                 }
             },
             "Symbol": {
                 "rich_text": [
                     {
                         "text": {
-                            "content": trade.symbol
+                            "content": "@symbol@"
                         }
                     }
                 ]
@@ -187,64 +209,255 @@ def create_notion_page(trade: Trade) -> Dict:
                 }
             },
             "Entry Price": {
-                "number": trade.entry_price
+                "number": "@entry_price@"
             },
             "Exit Price": {
-                "number": trade.exit_price
+                "number": "@exit_price@"
             },
             "Position Size": {
-                "number": trade.position_size
+                "number": "@position_size@"
             },
             "P/L ($)": {
-                "number": round(trade.pnl_dollars, 2)
+                "number": "@pnl_dollars@"
             },
             "P/L (%)": {
-                "number": round(trade.pnl_percent, 2)
+                "number": "@pnl_percent@"
             },
             "Result": {
                 "select": {
-                    "name": trade.result
+                    "name": "@result@"
                 }
             }
         }
     }
+    template = orjson.dumps(page).replace(b'%', b'%%')
+    return re.sub(rb'"@(\w+)@"', rb'%(\1)s', template)
+
+def create_notion_page(trade: Trade) -> bytes:
+    """Create Notion database entry for a trade, serialized as JSON"""
+    dumps = orjson.dumps
+    return _page_template(Config.NOTION_DATABASE_ID) % {
+        b'name': dumps(f"{trade.symbol} - {trade.entry_date[:10]}"),
+        b'date': dumps(parse_notion_date(trade.entry_date)),
+        b'symbol': dumps(trade.symbol),
+        b'entry_price': dumps(trade.entry_price),
+        b'exit_price': dumps(trade.exit_price),
+        b'position_size': dumps(trade.position_size),
+        b'pnl_dollars': dumps(round(trade.pnl_dollars, 2)),
+        b'pnl_percent': dumps(round(trade.pnl_percent, 2)),
+        b'result': dumps(trade.result),
+    }
+
+@lru_cache(maxsize=4096)
+def _format_notion_date(date_str: str) -> Optional[str]:
+    """Reformat "YYYY-MM-DD HHMMSS" as ISO by slicing, or None if malformed"""
+    if (len(date_str) != 17 or date_str[4] != '-' or date_str[7] != '-'
+            or date_str[10] != ' '):
+        return None
+    digits = date_str[0:4] + date_str[5:7] + date_str[8:10] + date_str[11:17]
+    if not digits.isdigit():
+        return None
+    return (f"{date_str[0:4]}-{date_str[5:7]}-{date_str[8:10]}"
+            f"T{date_str[11:13]}:{date_str[13:15]}:{date_str[15:17]}")
 
 def parse_notion_date(date_str: str) -> str:
     """Convert TradingView date format to Notion ISO format"""
-    try:
-        # TradingView format: "2025-10-30 142210"
-        dt = datetime.strptime(date_str, "%Y-%m-%d %H%M%S")
-        return dt.isoformat()
-    except:
+    # TradingView format: "2025-10-30 142210"
+    iso_date = _format_notion_date(date_str)
+    if iso_date is None:
         return datetime.now().isoformat()
+    return iso_date
+
+NOTION_PAGES_URL = "https://api.notion.com/v1/pages"
+
+# Up to 5 requests in flight overlap the round-trips, while request starts are
+# spaced out to stay within Notion's average limit of ~3 requests/second
+MAX_CONCURRENT_REQUESTS = 5
+MIN_REQUEST_INTERVAL = 1 / 3
+
+# Creating a page is not idempotent, so only retry when Notion cannot have
+# acted on the request: rate-limited (429) responses, and connection failures
+# before it was sent. Retries back off exponentially, honouring Notion's
+# Retry-After header when it is sent.
+MAX_RETRIES = 5
+BACKOFF_FACTOR = 0.5
+RETRY_STATUS = 429
+RETRY_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+# Trades are posted in rounds of this many pages; a round's payloads are built
+# only once the previous round has completed
+BATCH_SIZE = 50
+
+def _retry_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Seconds to wait before the next attempt"""
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return BACKOFF_FACTOR * (2 ** attempt)
+
+class RequestPacer:
+    """Enforces a minimum interval between the starts of successive requests"""
+    def __init__(self, interval: float = MIN_REQUEST_INTERVAL):
+        self.interval = interval
+        self.lock = asyncio.Lock()
+        self.next_start = 0.0
+    
+    async def wait(self):
+        """Sleep until this caller's start slot comes up"""
+        async with self.lock:
+            now = asyncio.get_running_loop().time()
+            if self.next_start > now:
+                await asyncio.sleep(self.next_start - now)
+                now = self.next_start
+            self.next_start = now + self.interval
 
-def sync_to_notion(trades: List[Trade]):
-    """Sync trades to Notion database"""
+async def _post_one(client: httpx.AsyncClient, sem: asyncio.Semaphore,
+                    pacer: RequestPacer, trade: Trade, body: bytes,
+                    log: List[str], on_synced: Callable[[Trade], None]) -> bool:
+    """Create a single Notion page for a trade, retrying transient failures"""
+    # Status lines go to the shared log instead of stdout so concurrent posts
+    # don't interleave output or block the event loop on writes
+    for attempt in range(MAX_RETRIES + 1):
+        retry_after = None
+        try:
+            async with sem:
+                await pacer.wait()
+                response = await client.post(NOTION_PAGES_URL, content=body)
+            if response.status_code == 200:
+                log.append(f"✓ Synced: {trade.symbol} | P/L: ${trade.pnl_dollars:.2f}\n")
+                break
+            error = response.text
+            if response.status_code != RETRY_STATUS:
+                log.append(f"✗ Failed: {trade.symbol} | Error: {error}\n")
+                return False
+            retry_after = response.headers.get("Retry-After")
+        except RETRY_EXCEPTIONS as e:
+            error = str(e)
+        except Exception as e:
+            log.append(f"✗ Error syncing {trade.symbol}: {str(e)}\n")
+            return False
+        
+        # Back off outside the semaphore so other trades can use the slot
+        if attempt < MAX_RETRIES:
+            await asyncio.sleep(_retry_delay(attempt, retry_after))
+    else:
+        log.append(f"✗ Failed: {trade.symbol} | Error: {error}\n")
+        return False
+    
+    # The page exists now, so a failure to record it is not a sync failure
+    try:
+        on_synced(trade)
+    except Exception as e:
+        log.append(f"⚠ Synced {trade.symbol} but could not record it: {str(e)}\n")
+    return True
+
+class NotionBatch:
+    """Posts trades to Notion in rounds, waiting for each round to finish"""
+    def __init__(self, client: httpx.AsyncClient, sem: asyncio.Semaphore,
+                 pacer: RequestPacer, on_synced: Callable[[Trade], None],
+                 max_items: int = BATCH_SIZE):
+        self.client = client
+        self.sem = sem
+        self.pacer = pacer
+        self.on_synced = on_synced
+        self.max_items = max_items
+        self.pending: List[Trade] = []
+        self.results: List[bool] = []
+        self.log: List[str] = []
+    
+    async def add(self, trade: Trade):
+        """Queue a trade, posting the round once it is full"""
+        self.pending.append(trade)
+        if len(self.pending) >= self.max_items:
+            await self.flush()
+    
+    async def flush(self):
+        """Build every queued payload, then post them together and wait"""
+        pending, self.pending = self.pending, []
+        bodies = [create_notion_page(trade) for trade in pending]
+        try:
+            self.results.extend(await asyncio.gather(
+                *[_post_one(self.client, self.sem, self.pacer, trade, body,
+                            self.log, self.on_synced)
+                  for trade, body in zip(pending, bodies)]
+            ))
+        finally:
+            # One write per round, even if the round was interrupted
+            sys.stdout.writelines(self.log)
+            self.log.clear()
+
+async def _post_trades(trades: List[Trade],
+                       on_synced: Callable[[Trade], None]) -> List[bool]:
+    """Post trades to Notion, returning whether each one succeeded"""
     headers = {
         "Authorization": f"Bearer {Config.NOTION_API_KEY}",
         "Content-Type": "application/json",
         "Notion-Version": "2022-06-28"
     }
     
-    success_count = 0
-    for trade in trades:
-        try:
-            page_data = create_notion_page(trade)
-            response = requests.post(
-                "https://api.notion.com/v1/pages",
-                headers=headers,
-                json=page_data
-            )
-            
-            if response.status_code == 200:
-                success_count += 1
-                print(f"✓ Synced: {trade.symbol} | P/L: ${trade.pnl_dollars:.2f}")
-            else:
-                print(f"✗ Failed: {trade.symbol} | Error: {response.text}")
-        except Exception as e:
-            print(f"✗ Error syncing {trade.symbol}: {str(e)}")
+    # One HTTP/2 client for every post: requests are multiplexed over a single
+    # keep-alive connection, so the TLS handshake is paid once per run
+    async with httpx.AsyncClient(http2=True, headers=headers, timeout=30) as client:
+        batch = NotionBatch(client, asyncio.Semaphore(MAX_CONCURRENT_REQUESTS),
+                            RequestPacer(), on_synced)
+        for trade in trades:
+            await batch.add(trade)
+        await batch.flush()
     
-    print(f"\nSynced {success_count}/{len(trades)} trades to Notion")
+    return batch.results
+
+def trade_key(trade: Trade) -> Optional[str]:
+    """Identify a trade by the pair of orders it was matched from"""
+    # Without both order IDs a trade can't be told apart from others across
+    # runs, so it gets no key and is never recorded or skipped
+    buy_id, sell_id = trade.buy_order.order_id, trade.sell_order.order_id
+    if not buy_id or not sell_id:
+        return None
+    return f"{buy_id}:{sell_id}"
+
+def load_synced_keys(conn: sqlite3.Connection, database_id: str) -> Set[str]:
+    """Keys of trades already synced to this Notion database on previous runs"""
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS synced ("
+        "database_id TEXT NOT NULL, key TEXT NOT NULL, "
+        "PRIMARY KEY (database_id, key))"
+    )
+    rows = conn.execute("SELECT key FROM synced WHERE database_id = ?", (database_id,))
+    return {key for (key,) in rows}
+
+def record_synced_key(conn: sqlite3.Connection, database_id: str, trade: Trade):
+    """Remember a trade that was synced successfully"""
+    # Committed per trade so an interrupted run doesn't repost pages it created
+    key = trade_key(trade)
+    if key is not None:
+        conn.execute(
+            "INSERT OR IGNORE INTO synced (database_id, key) VALUES (?, ?)",
+            (database_id, key)
+        )
+        conn.commit()
+
+async def sync_to_notion_async(trades: List[Trade]):
+    """Sync trades to Notion database concurrently, skipping ones already synced"""
+    conn = sqlite3.connect(Config.SYNC_STATE_DB)
+    try:
+        synced_keys = load_synced_keys(conn, Config.NOTION_DATABASE_ID)
+        # Trades without a key (blank order IDs) are never skipped
+        new_trades = [trade for trade in trades if trade_key(trade) not in synced_keys]
+        if len(new_trades) < len(trades):
+            print(f"Skipping {len(trades) - len(new_trades)} trades already synced "
+                  f"(recorded in {Config.SYNC_STATE_DB})")
+        if not new_trades:
+            print("\nNo new trades to sync")
+            return
+        
+        results = await _post_trades(new_trades, partial(record_synced_key, conn, Config.NOTION_DATABASE_ID))
+    finally:
+        conn.close()
+    
+    success_count = sum(results)
+    print(f"\nSynced {success_count}/{len(new_trades)} trades to Notion")
 
 def main():
     print("=== TradingView to Notion Sync ===")
@@ -261,11 +474,20 @@ def main():
         print("  CSV_FILE_PATH - Path to TradingView CSV file (optional)")
         return
     
-    # Parse CSV
-    orders = parse_csv(Config.CSV_FILE_PATH)
+    # Parse CSV; rows stream from disk, but the filled orders are collected in
+    # memory since matching needs them all
+    try:
+        orders = list(iter_orders(Config.CSV_FILE_PATH))
+    except FileNotFoundError:
+        print(f"Error: CSV file not found: {Config.CSV_FILE_PATH}")
+        return
+    except Exception as e:
+        print(f"Error parsing CSV: {str(e)}")
+        return
     if not orders:
         print("No orders found in CSV file")
         return
+    print(f"Parsed {len(orders)} filled orders from CSV")
     
     # Match trades
     trades = match_trades(orders)
@@ -274,7 +496,7 @@ def main():
         return
     
     # Sync to Notion
-    sync_to_notion(trades)
+    asyncio.run(sync_to_notion_async(trades))
     print("\nSync complete!")
 
 if __name__ == "__main__":